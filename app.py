@@ -1,10 +1,134 @@
+import fcntl
+import html
 import os
+import queue
+import re
 import sqlite3
-from flask import Flask, flash, redirect, render_template, request, session
-from flask_session import Session
-from werkzeug.security import check_password_hash, generate_password_hash
-from datetime import datetime, timedelta
-from functools import wraps
+from contextlib import contextmanager
+from itertools import chain
+from flask import (Flask, Response, flash, get_flashed_messages, redirect,
+                   render_template, request, session, stream_template,
+                   stream_with_context)
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError
+from werkzeug.security import check_password_hash
+from datetime import date
+from functools import lru_cache, wraps
+
+DATABASE = 'expenses.db'
+
+# SQLite serializes writers anyway, so a single read-write connection
+# suffices; reads run in parallel on a larger read-only pool.
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "1"))
+DB_RO_POOL_SIZE = int(os.environ.get("DB_RO_POOL_SIZE", "8"))
+
+# mode=ro skips write-lock acquisition entirely and cache=shared lets the
+# read-only connections share one page cache.
+DATABASE_RO_URI = 'file:' + DATABASE + '?mode=ro&cache=shared'
+
+# Applied once per pooled connection so every request reuses a warm,
+# consistently configured handle.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA wal_autocheckpoint=1000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+    "PRAGMA foreign_keys=ON",
+)
+
+# Read-only connections can't change the journal mode and never write,
+# so they only get the read-relevant tuning plus a query_only guard.
+_RO_CONNECTION_PRAGMAS = (
+    "PRAGMA query_only=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-20000",
+)
+
+# SQL lives in module-level constants so every request passes the exact
+# same statement text to conn.execute and sqlite3's per-connection
+# statement cache never misses on the hot endpoints.
+SQL_DASHBOARD = """
+    WITH total_cte AS (
+        SELECT SUM(amount) AS total
+        FROM expenses
+        WHERE user_id = :uid
+    ),
+    cat_cte AS (
+        SELECT category_id, SUM(amount) AS total
+        FROM expenses
+        WHERE user_id = :uid
+        GROUP BY category_id
+        ORDER BY total DESC
+        LIMIT -1
+    ),
+    recent_cte AS (
+        SELECT id, category_id, amount, description, date, created_at
+        FROM expenses
+        WHERE user_id = :uid
+        ORDER BY date DESC, created_at DESC
+        LIMIT 10
+    ),
+    monthly_cte AS (
+        SELECT month, total FROM (
+            SELECT strftime('%Y-%m', date) AS month, SUM(amount) AS total
+            FROM expenses
+            WHERE user_id = :uid
+            GROUP BY month
+            ORDER BY month DESC
+            LIMIT 6
+        )
+        ORDER BY month ASC
+        LIMIT 6
+    )
+    SELECT 'total' AS tag, NULL AS id, NULL AS category_id, NULL AS month,
+           total AS amount, NULL AS description, NULL AS date,
+           NULL AS created_at
+    FROM total_cte
+    UNION ALL
+    SELECT 'by_cat', NULL, category_id, NULL, total, NULL, NULL, NULL
+    FROM cat_cte
+    UNION ALL
+    SELECT 'recent', id, category_id, NULL, amount, description, date,
+           created_at
+    FROM recent_cte
+    UNION ALL
+    SELECT 'monthly', NULL, NULL, month, total, NULL, NULL, NULL
+    FROM monthly_cte
+"""
+
+SQL_CATEGORIES = "SELECT * FROM categories"
+
+SQL_INSERT_EXPENSE = """
+    INSERT INTO expenses (user_id, category_id, amount, description, date)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+SQL_HISTORY = """
+    SELECT id, category_id, amount, description, date, created_at
+    FROM expenses
+    WHERE user_id = ?
+    ORDER BY date DESC, created_at DESC
+"""
+
+SQL_DELETE_EXPENSE = "DELETE FROM expenses WHERE id = ? AND user_id = ?"
+
+SQL_USER_TOTAL = "SELECT SUM(amount) AS total FROM expenses WHERE user_id = ?"
+
+SQL_USER_BY_NAME = "SELECT id, username, hash FROM users WHERE username = ? LIMIT 1"
+
+SQL_INSERT_USER = "INSERT INTO users (username, hash) VALUES (?, ?)"
+
+SQL_UPDATE_USER_HASH = "UPDATE users SET hash = ? WHERE id = ?"
+
+# Argon2id via argon2-cffi's C backend: substantially cheaper per unit
+# security than werkzeug's PBKDF2 default, which dominated login CPU.
+_password_hasher = PasswordHasher()
+
+# Currency amount: up to 12 integer digits and at most 2 decimals.
+# Compiled once so bad submissions are rejected by a single match call
+# instead of float()'s exception machinery.
+_AMOUNT_RE = re.compile(r'^\d{1,12}(\.\d{1,2})?$')
 
 
 def login_required(f):
@@ -14,55 +138,246 @@ def login_required(f):
     """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        if session.get("user_id") is None:
+        user_id = session.get("user_id")
+        if user_id is None:
             return redirect("/login")
         return f(*args, **kwargs)
     return decorated_function
 
 
+# Bound format method so the "$x,xxx.xx" spec is parsed once instead of
+# on every rendered row.
+_USD_FORMAT = "${:,.2f}".format
+
+
 def usd(value):
     """Format value as USD."""
-    return f"${value:,.2f}"
+    return _USD_FORMAT(value)
+
+
+def verify_password(stored_hash, password):
+    """Check a password against an Argon2 or legacy werkzeug hash."""
+    if stored_hash.startswith("$argon2"):
+        try:
+            _password_hasher.verify(stored_hash, password)
+            return True
+        except VerificationError:
+            return False
+    # Hashes created before the Argon2 switch (werkzeug pbkdf2/scrypt)
+    return check_password_hash(stored_hash, password)
 
 
-def get_db_connection():
-    """Get database connection."""
-    conn = sqlite3.connect('expenses.db')
+def _create_connection(readonly=False):
+    """Open and configure one connection for a pool."""
+    if readonly:
+        conn = sqlite3.connect(DATABASE_RO_URI, uri=True, check_same_thread=False,
+                               isolation_level=None, cached_statements=256)
+        pragmas = _RO_CONNECTION_PRAGMAS
+    else:
+        conn = sqlite3.connect(DATABASE, check_same_thread=False, isolation_level=None,
+                               cached_statements=256)
+        pragmas = _CONNECTION_PRAGMAS
     conn.row_factory = sqlite3.Row
+    conn.set_trace_callback(None)
+    for pragma in pragmas:
+        conn.execute(pragma)
     return conn
 
 
+def _create_db_pool(size, readonly=False):
+    """Build a bounded pool of pre-opened connections."""
+    pool = queue.Queue(maxsize=size)
+    for _ in range(size):
+        pool.put(_create_connection(readonly=readonly))
+    return pool
+
+
+@contextmanager
+def db(readonly=False):
+    """Borrow a pooled connection for the duration of a request.
+
+    Pass readonly=True for endpoints that never write; those share the
+    larger read-only pool and don't contend with the writer.
+    """
+    pool = _ro_pool if readonly else _db_pool
+    conn = pool.get()
+    try:
+        yield conn
+    finally:
+        pool.put(conn)
+
+
+@contextmanager
+def write_transaction(conn):
+    """Run writes inside an explicit BEGIN IMMEDIATE transaction.
+
+    The implicit deferred transaction only upgrades to a write lock
+    mid-statement, which can surface as SQLITE_BUSY under concurrent
+    writers; IMMEDIATE takes the lock deterministically up front.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def insert_expenses(conn, rows):
+    """Bulk-insert (user_id, category_id, amount, description, date) rows.
+
+    One IMMEDIATE transaction plus executemany amortizes statement setup
+    and commit cost across the whole batch.
+    """
+    with write_transaction(conn):
+        conn.executemany(SQL_INSERT_EXPENSE, rows)
+
+
+# The categories table is static after init_db(), so the list is loaded
+# from SQLite once per process. Reset to None to invalidate if an admin
+# endpoint ever mutates categories.
+_categories_cache = None
+_category_map = None
+
+
+def get_categories():
+    """Return the category list, querying the database only once."""
+    global _categories_cache
+    if _categories_cache is None:
+        with db(readonly=True) as conn:
+            _categories_cache = conn.execute(SQL_CATEGORIES).fetchall()
+    return _categories_cache
+
+
+def get_category_map():
+    """Return an id -> (name, color) lookup built from the cached list."""
+    global _category_map
+    if _category_map is None:
+        _category_map = {row["id"]: (row["name"], row["color"])
+                         for row in get_categories()}
+    return _category_map
+
+
+_category_options_html = None
+
+
+def get_category_options_html():
+    """Pre-rendered <option> markup for the category select, built once.
+
+    Saves Jinja from re-rendering the category loop on every GET /add and
+    every failed submission; invalidate together with _categories_cache.
+    """
+    global _category_options_html
+    if _category_options_html is None:
+        _category_options_html = "".join(
+            f'<option value="{row["id"]}">{html.escape(row["name"])}</option>'
+            for row in get_categories())
+    return _category_options_html
+
+
+def _decorate_expense(row, category_map):
+    """Attach category_name/color to an expense row from the in-memory map."""
+    expense = dict(row)
+    expense["category_name"], expense["color"] = category_map[row["category_id"]]
+    return expense
+
+
+@lru_cache(maxsize=1)
+def _today_string(ordinal):
+    return date.fromordinal(ordinal).strftime('%Y-%m-%d')
+
+
+def today_string():
+    """Today as YYYY-MM-DD, re-formatted only when the date changes."""
+    return _today_string(date.today().toordinal())
+
+
 def init_db():
     """Initialize the database."""
-    conn = get_db_connection()
+    conn = sqlite3.connect(DATABASE)
     with open('schema.sql', 'r') as f:
         conn.executescript(f.read())
+    # Switch the file to write-ahead logging up front: journal_mode is
+    # persistent, so readers never block the writer and each commit is a
+    # single WAL append instead of two rollback-journal fsyncs.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA wal_autocheckpoint=1000")
     conn.commit()
     conn.close()
 
 
+def bootstrap_db():
+    """Run init_db() exactly once, even when several workers start together.
+
+    Under a pre-fork server every worker imports this module; an exclusive
+    flock on a sentinel file makes the exists-check + init atomic so only
+    the first worker creates the schema.
+    """
+    lock_fd = os.open(DATABASE + '.lock', os.O_CREAT | os.O_RDWR)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        if not os.path.exists(DATABASE):
+            init_db()
+    finally:
+        fcntl.flock(lock_fd, fcntl.LOCK_UN)
+        os.close(lock_fd)
+
+
 # Configure application
 app = Flask(__name__)
 
 # Custom filter
 app.jinja_env.filters["usd"] = usd
 
-# Configure session to use filesystem (instead of signed cookies)
-app.config["SESSION_PERMANENT"] = False
-app.config["SESSION_TYPE"] = "filesystem"
-Session(app)
+# Sessions only hold user_id and username, which fit comfortably in a
+# signed cookie — no per-request session file reads/writes on the server.
+# The signature is all that prevents a forged user_id, so refuse to start
+# without a real key rather than fall back to a well-known default.
+app.secret_key = os.environ.get("SECRET_KEY")
+if not app.secret_key:
+    if app.debug:
+        app.secret_key = "dev"
+    else:
+        raise RuntimeError(
+            "SECRET_KEY environment variable must be set to sign session cookies")
+
+# Initialize database (lock-guarded against concurrent worker startup)
+bootstrap_db()
+
+# Open the connection pools once per process: one writer connection is
+# enough (SQLite serializes writers), reads fan out over the RO pool
+_db_pool = _create_db_pool(DB_POOL_SIZE)
+_ro_pool = _create_db_pool(DB_RO_POOL_SIZE, readonly=True)
+app.db_pool = _db_pool
+app.db_ro_pool = _ro_pool
+
+# One-shot migration for databases created before schema.sql grew these
+# indexes; a no-op on fresh databases.
+with db() as _conn:
+    _conn.execute("""CREATE INDEX IF NOT EXISTS idx_expenses_user_date
+                     ON expenses(user_id, date DESC, created_at DESC)""")
+    _conn.execute("""CREATE INDEX IF NOT EXISTS idx_expenses_user_category
+                     ON expenses(user_id, category_id)""")
+
+
+# Only pages carrying per-user data need the no-store treatment; the
+# login/register forms stay cacheable.
+_NOCACHE_ENDPOINTS = {"index", "add", "history", "delete"}
 
-# Initialize database
-if not os.path.exists('expenses.db'):
-    init_db()
+_NOCACHE_HEADERS = {
+    "Cache-Control": "no-cache, no-store, must-revalidate",
+    "Expires": "0",
+    "Pragma": "no-cache",
+}
 
 
 @app.after_request
 def after_request(response):
-    """Ensure responses aren't cached"""
-    response.headers["Cache-Control"] = "no-cache, no-store, must-revalidate"
-    response.headers["Expires"] = 0
-    response.headers["Pragma"] = "no-cache"
+    """Ensure authenticated responses aren't cached"""
+    if request.endpoint in _NOCACHE_ENDPOINTS:
+        response.headers.update(_NOCACHE_HEADERS)
     return response
 
 
@@ -70,158 +385,163 @@ def after_request(response):
 @login_required
 def index():
     """Show dashboard with expense summary"""
-    conn = get_db_connection()
-    
-    # Get total expenses
-    total = conn.execute(
-        "SELECT SUM(amount) as total FROM expenses WHERE user_id = ?",
-        (session["user_id"],)
-    ).fetchone()["total"] or 0
-    
-    # Get expenses by category
-    expenses_by_category = conn.execute("""
-        SELECT c.name, c.color, SUM(e.amount) as total
-        FROM expenses e
-        JOIN categories c ON e.category_id = c.id
-        WHERE e.user_id = ?
-        GROUP BY c.id, c.name, c.color
-        ORDER BY total DESC
-    """, (session["user_id"],)).fetchall()
-    
-    # Get recent expenses
-    recent_expenses = conn.execute("""
-        SELECT e.*, c.name as category_name, c.color
-        FROM expenses e
-        JOIN categories c ON e.category_id = c.id
-        WHERE e.user_id = ?
-        ORDER BY e.date DESC, e.created_at DESC
-        LIMIT 10
-    """, (session["user_id"],)).fetchall()
-    
-    # Get monthly trend (last 6 months)
-    monthly_expenses = conn.execute("""
-        SELECT strftime('%Y-%m', date) as month, SUM(amount) as total
-        FROM expenses
-        WHERE user_id = ?
-        GROUP BY month
-        ORDER BY month DESC
-        LIMIT 6
-    """, (session["user_id"],)).fetchall()
-    
-    conn.close()
-    
-    return render_template("index.html", 
+    # One round-trip for the whole dashboard: each summary lives in its
+    # own CTE and the branches are UNION ALLed into a uniform row shape
+    # distinguished by a tag column. The LIMIT clauses also stop SQLite
+    # from flattening the CTEs, so each branch's ORDER BY is preserved.
+    uid = session["user_id"]
+    with db(readonly=True) as conn:
+        rows = conn.execute(SQL_DASHBOARD, {"uid": uid}).fetchall()
+
+    # Partition the tagged rows back into the four dashboard datasets,
+    # resolving category name/color from the in-memory map instead of a
+    # JOIN in the query.
+    category_map = get_category_map()
+    total = 0
+    expenses_by_category = []
+    recent_expenses = []
+    monthly_expenses = []
+    for row in rows:
+        tag = row["tag"]
+        if tag == "total":
+            total = row["amount"] or 0
+        elif tag == "by_cat":
+            name, color = category_map[row["category_id"]]
+            expenses_by_category.append(
+                {"name": name, "color": color, "total": row["amount"]})
+        elif tag == "recent":
+            name, color = category_map[row["category_id"]]
+            recent_expenses.append(
+                {"id": row["id"], "category_name": name, "color": color,
+                 "amount": row["amount"], "description": row["description"],
+                 "date": row["date"], "created_at": row["created_at"]})
+        else:
+            monthly_expenses.append({"month": row["month"], "total": row["amount"]})
+
+    return render_template("index.html",
                          total=total,
                          expenses_by_category=expenses_by_category,
                          recent_expenses=recent_expenses,
-                         monthly_expenses=list(reversed(monthly_expenses)))
+                         monthly_expenses=monthly_expenses)
+
+
+def _render_add_form(message):
+    """Re-render the add form for a failed submission."""
+    flash(message, "danger")
+    return render_template("add.html",
+                           category_options=get_category_options_html())
 
 
 @app.route("/add", methods=["GET", "POST"])
 @login_required
 def add():
     """Add new expense"""
-    conn = get_db_connection()
-    
     if request.method == "POST":
-        # Validate input
+        uid = session["user_id"]
         category_id = request.form.get("category")
         amount = request.form.get("amount")
         description = request.form.get("description")
         date = request.form.get("date")
-        
-        if not category_id:
-            flash("Must select category", "danger")
-            categories = conn.execute("SELECT * FROM categories").fetchall()
-            conn.close()
-            return render_template("add.html", categories=categories)
-        
+
+        # Validate everything before touching the database; the category
+        # must exist, or the INSERT would trip the foreign-key constraint
+        if not category_id or not category_id.isdigit():
+            return _render_add_form("Must select category")
+
+        category_id = int(category_id)
+        if category_id not in get_category_map():
+            return _render_add_form("Must select category")
+
         if not amount:
-            flash("Must provide amount", "danger")
-            categories = conn.execute("SELECT * FROM categories").fetchall()
-            conn.close()
-            return render_template("add.html", categories=categories)
-        
-        try:
-            amount = float(amount)
-            if amount <= 0:
-                raise ValueError
-        except ValueError:
-            flash("Amount must be a positive number", "danger")
-            categories = conn.execute("SELECT * FROM categories").fetchall()
-            conn.close()
-            return render_template("add.html", categories=categories)
-        
+            return _render_add_form("Must provide amount")
+
+        if not _AMOUNT_RE.match(amount):
+            return _render_add_form("Amount must be a positive number")
+
+        amount = float(amount)
+        if amount <= 0:
+            return _render_add_form("Amount must be a positive number")
+
         if not description:
-            flash("Must provide description", "danger")
-            categories = conn.execute("SELECT * FROM categories").fetchall()
-            conn.close()
-            return render_template("add.html", categories=categories)
-        
+            return _render_add_form("Must provide description")
+
         if not date:
-            date = datetime.now().strftime('%Y-%m-%d')
-        
+            date = today_string()
+
         # Insert expense
-        conn.execute("""
-            INSERT INTO expenses (user_id, category_id, amount, description, date)
-            VALUES (?, ?, ?, ?, ?)
-        """, (session["user_id"], category_id, amount, description, date))
-        conn.commit()
-        conn.close()
-        
+        with db() as conn:
+            with write_transaction(conn):
+                conn.execute(SQL_INSERT_EXPENSE,
+                             (uid, category_id, amount, description, date))
+
         flash("Expense added successfully!", "success")
         return redirect("/")
-    
+
     else:
-        categories = conn.execute("SELECT * FROM categories").fetchall()
-        conn.close()
-        today = datetime.now().strftime('%Y-%m-%d')
-        return render_template("add.html", categories=categories, today=today)
+        return render_template("add.html",
+                               category_options=get_category_options_html(),
+                               today=today_string())
 
 
 @app.route("/history")
 @login_required
 def history():
     """Show expense history"""
-    conn = get_db_connection()
-    
-    # Get all expenses
-    expenses = conn.execute("""
-        SELECT e.*, c.name as category_name, c.color
-        FROM expenses e
-        JOIN categories c ON e.category_id = c.id
-        WHERE e.user_id = ?
-        ORDER BY e.date DESC, e.created_at DESC
-    """, (session["user_id"],)).fetchall()
-    
-    conn.close()
-    
-    return render_template("history.html", expenses=expenses)
+    # Stream rows straight from the cursor into the template so a large
+    # history never materializes fully in memory; the footer total comes
+    # from a cheap SUM instead of re-iterating the rows.
+    uid = session["user_id"]
+    conn = _ro_pool.get()
+    try:
+        total = conn.execute(SQL_USER_TOTAL, (uid,)).fetchone()["total"] or 0
+        cursor = conn.execute(SQL_HISTORY, (uid,))
+        first = cursor.fetchone()
+    except BaseException:
+        _ro_pool.put(conn)
+        raise
+
+    if first is None:
+        # Empty history: nothing to stream, render the empty state
+        _ro_pool.put(conn)
+        return render_template("history.html", expenses=[], total=0)
+
+    # Pop flashed messages now, while the session can still make it into
+    # the cookie: Flask serializes the session before the streamed body
+    # runs, so popping from inside the template happens too late and the
+    # messages re-appear on the next page. The popped list is cached on
+    # the request context, so the layout still renders them.
+    get_flashed_messages(with_categories=True)
+
+    category_map = get_category_map()
+    expenses = (_decorate_expense(row, category_map)
+                for row in chain([first], cursor))
+
+    def generate():
+        # Hold the connection until the stream is fully consumed
+        try:
+            yield from stream_template("history.html",
+                                       expenses=expenses,
+                                       total=total)
+        finally:
+            _ro_pool.put(conn)
+
+    return Response(stream_with_context(generate()), mimetype="text/html")
 
 
 @app.route("/delete/<int:expense_id>", methods=["POST"])
 @login_required
 def delete(expense_id):
     """Delete an expense"""
-    conn = get_db_connection()
-    
-    # Verify ownership
-    expense = conn.execute(
-        "SELECT * FROM expenses WHERE id = ? AND user_id = ?",
-        (expense_id, session["user_id"])
-    ).fetchone()
-    
-    if not expense:
+    # The user_id predicate folds the ownership check into the DELETE
+    # itself; rowcount tells us whether anything matched.
+    uid = session["user_id"]
+    with db() as conn:
+        cur = conn.execute(SQL_DELETE_EXPENSE, (expense_id, uid))
+
+    if cur.rowcount == 0:
         flash("Expense not found", "danger")
-        conn.close()
-        return redirect("/history")
-    
-    # Delete expense
-    conn.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
-    conn.commit()
-    conn.close()
-    
-    flash("Expense deleted successfully!", "success")
+    else:
+        flash("Expense deleted successfully!", "success")
     return redirect("/history")
 
 
@@ -241,24 +561,32 @@ def login():
             flash("Must provide password", "danger")
             return render_template("login.html")
         
-        # Query database for username
-        conn = get_db_connection()
-        rows = conn.execute(
-            "SELECT * FROM users WHERE username = ?",
-            (request.form.get("username"),)
-        ).fetchall()
-        conn.close()
-        
+        # Query database for username; the connection goes back to the
+        # pool before the CPU-heavy hash verification below, so KDF time
+        # never counts against pool hold time under concurrent logins.
+        with db(readonly=True) as conn:
+            user = conn.execute(
+                SQL_USER_BY_NAME, (request.form.get("username"),)
+            ).fetchone()
+
         # Ensure username exists and password is correct
-        if len(rows) != 1 or not check_password_hash(rows[0]["hash"], request.form.get("password")):
+        if user is None or not verify_password(user["hash"], request.form.get("password")):
             flash("Invalid username and/or password", "danger")
             return render_template("login.html")
-        
+
+        # Transparently upgrade legacy werkzeug hashes now that the
+        # password is known to be correct; hash first, borrow a
+        # connection only for the UPDATE itself
+        if not user["hash"].startswith("$argon2"):
+            new_hash = _password_hasher.hash(request.form.get("password"))
+            with db() as conn:
+                conn.execute(SQL_UPDATE_USER_HASH, (new_hash, user["id"]))
+
         # Remember which user has logged in
-        session["user_id"] = rows[0]["id"]
-        session["username"] = rows[0]["username"]
-        
-        flash(f"Welcome back, {rows[0]['username']}!", "success")
+        session["user_id"] = user["id"]
+        session["username"] = user["username"]
+
+        flash(f"Welcome back, {user['username']}!", "success")
         return redirect("/")
     
     else:
@@ -302,34 +630,24 @@ def register():
             return render_template("register.html")
         
         # Hash password
-        hash_pw = generate_password_hash(password)
+        hash_pw = _password_hasher.hash(password)
         
         # Insert user into database
-        conn = get_db_connection()
         try:
-            conn.execute(
-                "INSERT INTO users (username, hash) VALUES (?, ?)",
-                (username, hash_pw)
-            )
-            conn.commit()
-            
-            # Get user ID
-            user = conn.execute(
-                "SELECT * FROM users WHERE username = ?",
-                (username,)
-            ).fetchone()
-            
+            with db() as conn:
+                conn.execute(SQL_INSERT_USER, (username, hash_pw))
+
+                # Get user ID
+                user = conn.execute(SQL_USER_BY_NAME, (username,)).fetchone()
+
             # Remember which user has logged in
             session["user_id"] = user["id"]
             session["username"] = user["username"]
-            
-            conn.close()
-            
+
             flash("Registration successful!", "success")
             return redirect("/")
-        
+
         except sqlite3.IntegrityError:
-            conn.close()
             flash("Username already exists", "danger")
             return render_template("register.html")
     
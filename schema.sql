@@ -26,6 +26,14 @@ CREATE TABLE IF NOT EXISTS expenses (
     FOREIGN KEY (category_id) REFERENCES categories (id)
 );
 
+-- Indexes matching the hot filter + sort keys: the first lets the
+-- recent/history queries read rows already in order (no temp B-tree),
+-- the second serves the dashboard's per-category GROUP BY.
+CREATE INDEX IF NOT EXISTS idx_expenses_user_date
+    ON expenses(user_id, date DESC, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_expenses_user_category
+    ON expenses(user_id, category_id);
+
 -- Insert default categories
 INSERT INTO categories (name, color) VALUES
     ('Food & Dining', '#FF6384'),